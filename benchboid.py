@@ -0,0 +1,163 @@
+#!/usr/bin/env python
+"""
+Headless timing of the simulation.
+Runs the same seeded flock with each set of Simulation options and reports
+the CPU seconds taken per simulated second, best of a few repeats.
+Then compares large time steps with and without adaptive sub-stepping
+against a short step, by cost and by how the flock looks once settled.
+"""
+from __future__ import division, print_function, absolute_import
+
+import argparse
+import random
+import time
+from math import hypot
+
+from boid import Boid, interact_pairs
+from boid_swarm import BoidSwarm
+from leader import Leader
+import simulation
+
+try:
+    cpu_time = time.process_time
+except AttributeError:
+    cpu_time = time.clock
+
+# name -> Simulation options
+CONFIGS = [
+    ('baseline', {}),
+    ('locality', dict(locality=True)),
+    ('pairwise', dict(pairwise=True)),
+    ('pairwise+locality', dict(pairwise=True, locality=True)),
+]
+
+# name -> Simulation options, whether to run at the large time step
+STEP_CONFIGS = [
+    ('baseline', {}, False),
+    ('baseline', {}, True),
+    ('adaptive', dict(adaptive=True), True),
+    ('pairwise+adaptive', dict(pairwise=True, adaptive=True), True),
+]
+
+
+def run(opts, boids, field, seconds, dt, seed):
+    """time one seeded run, returning the CPU seconds taken"""
+    random.seed(seed)
+    sim = simulation.Simulation(boids, field, verbose=False, **opts)
+    ticks = int(round(seconds / dt))
+    start = cpu_time()
+    for _ in range(ticks):
+        sim.update(dt)
+    return cpu_time() - start
+
+
+def flock_stats(boids):
+    """
+    Polarisation (length of the mean heading, 1 when all boids fly the same
+    way), mean distance to the nearest neighbour, and mean speed.
+    """
+    hx = hy = 0.0
+    nearest = 0.0
+    for a in boids:
+        speed = abs(a.velocity)
+        if speed:
+            hx += a.velocity.x / speed
+            hy += a.velocity.y / speed
+        nearest += min(abs(a.position - b.position) for b in boids if b is not a)
+    n = len(boids)
+    return (hypot(hx, hy) / n, nearest / n,
+            sum(abs(b.velocity) for b in boids) / n)
+
+
+def run_settled(opts, boids, field, seconds, dt, seed):
+    """
+    Time one seeded run, also sampling flock_stats every half simulated
+    second once the first fifth of the run has passed. Returns the CPU
+    seconds taken and the averaged stats.
+    """
+    random.seed(seed)
+    sim = simulation.Simulation(boids, field, verbose=False, **opts)
+    ticks = int(round(seconds / dt))
+    every = max(1, int(round(0.5 / dt)))
+    taken = 0.0
+    samples = []
+    for tick in range(1, ticks + 1):
+        start = cpu_time()
+        sim.update(dt)
+        taken += cpu_time() - start
+        if tick % every == 0 and tick > ticks // 5:
+            samples.append(flock_stats(sim.swarm.boids))
+    return taken, [sum(s[i] for s in samples) / len(samples) for i in range(3)]
+
+
+def check_pairwise(boids, cell_w, seed):
+    """
+    Compare interact_pairs against Boid.interact on the same frozen flock,
+    returning the largest difference in acceleration and the number of boids
+    whose neighbors or crowded values disagree.
+    """
+    random.seed(seed)
+    swarm = BoidSwarm(830, cell_w)
+    for k in range(boids):
+        cls = Leader if k % 50 == 0 else Boid
+        swarm.boids.append(cls(random.uniform(100, 400), random.uniform(100, 400)))
+    swarm.rebuild()
+
+    expected = []
+    for b in swarm.boids:
+        b.interact(swarm.find_near(b.position.x, b.position.y, b.influence_range))
+        expected.append((b.acceleration.copy(), b.neighbors, b.crowded))
+
+    for b in swarm.boids:
+        b.clear_sums()
+    interact_pairs(swarm.cell_pairs(Boid.influence_range))
+    for b in swarm.boids:
+        b.apply_sums()
+
+    diff = 0.0
+    mismatched = 0
+    for b, (acc, neighbors, crowded) in zip(swarm.boids, expected):
+        diff = max(diff, abs(b.acceleration - acc))
+        if b.neighbors != neighbors or b.crowded != crowded:
+            mismatched += 1
+    return diff, mismatched
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--boids', type=int, default=400)
+    parser.add_argument('--field', type=int, default=750)
+    parser.add_argument('--seconds', type=float, default=5.0, help="simulated time per run")
+    parser.add_argument('--dt', type=float, default=1/30)
+    parser.add_argument('--big-dt', type=float, default=0.5, help="large time step to compare")
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    # the default cell, and cells narrower than the influence range
+    for cell_w in (Boid.influence_range + 5, Boid.influence_range / 2):
+        diff, mismatched = check_pairwise(args.boids, cell_w, args.seed)
+        print('pairwise vs interact, cell width %.1f: max acceleration diff %.2g, '
+              '%d neighbour counts differ' % (cell_w, diff, mismatched))
+        if diff > 1e-9 or mismatched:
+            raise SystemExit('pairwise pass does not match interact')
+
+    print('%d boids, %.1fs simulated, best of %d' % (args.boids, args.seconds, args.repeat))
+    for name, opts in CONFIGS:
+        best = min(run(opts, args.boids, args.field, args.seconds, args.dt, args.seed)
+                   for _ in range(args.repeat))
+        print('%-20s dt=%.4f  %.3f cpu s per simulated s' % (name, args.dt, best / args.seconds))
+
+    print('settled flock, mean over %d seeds' % args.repeat)
+    print('%-20s %-9s %-8s %-13s %-8s %s' % ('', 'dt', 'cpu/s', 'polarisation', 'nearest', 'speed'))
+    for name, opts, big in STEP_CONFIGS:
+        dt = args.big_dt if big else args.dt
+        runs = [run_settled(opts, args.boids, args.field, args.seconds, dt, args.seed + k)
+                for k in range(args.repeat)]
+        taken = sum(r[0] for r in runs) / len(runs)
+        stats = [sum(r[1][i] for r in runs) / len(runs) for i in range(3)]
+        print('%-20s %-9.4f %-8.3f %-13.3f %-8.1f %.1f' % ((name, dt, taken / args.seconds) + tuple(stats)))
+
+
+if __name__ == '__main__':
+    main()
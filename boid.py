@@ -1,5 +1,5 @@
 import random
-from math import cos, atan2
+from math import cos, atan2, sqrt
 from math import sin
 from vector2 import Vector2
 
@@ -14,6 +14,67 @@ def limit(vector, lim):
         vector *= lim
 
 
+def interact_pairs(cell_pairs):
+    """
+    Symmetric version of Boid.interact: each pair of boids is only looked at
+    once, and its separation, alignment and cohesion terms are added to both.
+    cell_pairs yields (cell, other) tuples as from BoidSwarm.cell_pairs, where
+    other is cell itself for the pairs inside a cell.
+    Boids must have had clear_sums called first, and apply_sums after.
+    """
+    for cell, other in cell_pairs:
+        if cell is other:
+            n = len(cell)
+            for a in cell:
+                a.neighbors += n
+            boids = list(cell)
+            pairs = ((boids[i], boids[j]) for i in range(n) for j in range(i+1, n))
+        else:
+            for a in cell:
+                a.neighbors += len(other)
+            for b in other:
+                b.neighbors += len(cell)
+            pairs = ((a, b) for a in cell for b in other)
+
+        for a, b in pairs:
+            # vector pointing from b to a
+            dx = a.position.x - b.position.x
+            dy = a.position.y - b.position.y
+            d = sqrt(dx*dx + dy*dy)
+            if d == 0:
+                continue
+            dx /= d
+            dy /= d
+
+            if d < a.influence_range:
+                a._count += 1
+                if d < a.minsep:
+                    a.crowded = True
+                    a._sep_x += dx / d
+                    a._sep_y += dy / d
+                else:
+                    a._sep_x += dx
+                    a._sep_y += dy
+                a._cohes_x += b.position.x
+                a._cohes_y += b.position.y
+                a._align_x += b.velocity.x
+                a._align_y += b.velocity.y
+
+            if d < b.influence_range:
+                b._count += 1
+                if d < b.minsep:
+                    b.crowded = True
+                    b._sep_x -= dx / d
+                    b._sep_y -= dy / d
+                else:
+                    b._sep_x -= dx
+                    b._sep_y -= dy
+                b._cohes_x += a.position.x
+                b._cohes_y += a.position.y
+                b._align_x += a.velocity.x
+                b._align_y += a.velocity.y
+
+
 class Boid(object):
 
     """
@@ -27,6 +88,10 @@ class Boid(object):
     cohesion_strength = 1.5
     align_strength = 1.4
     sep_strength = 1.0
+    # share of a cell (or of minsep when crowded) a boid may cover in one
+    # step when the simulation sub-steps it, in at most max_substeps steps
+    step_fraction = 0.5
+    max_substeps = 16
 
     # cohesion_strength *=  max_force
     # align_strength *=  max_force
@@ -62,6 +127,7 @@ class Boid(object):
     def __init__(self, x, y):
         """ create a new boid at x,y """
         self.neighbors = 0
+        self.clear_sums()
 
         self.position = Vector2(x, y)
         self.acceleration = Vector2(0, 0)
@@ -92,6 +158,21 @@ class Boid(object):
         limit(self.velocity, self.max_speed)
         self.position += self.velocity * t
 
+    def substeps(self, t, cell_width):
+        """
+        How many equal steps to split t into so the boid covers at most
+        step_fraction of a cell per step, or of minsep if it was within minsep
+        of a neighbour at its last interaction. Slow, uncrowded boids take one.
+        Always a power of two, so the steps of different boids line up.
+        """
+        reach = self.minsep if self.crowded else cell_width
+        speed = min(self.max_speed, abs(self.velocity) + abs(self.acceleration) * t)
+        needed = speed * t / (self.step_fraction * reach)
+        n = 1
+        while n < needed and n < self.max_substeps:
+            n *= 2
+        return n
+
     # Calculation variables for interact method - init once instead of on each call
     _sep_f = Vector2(0, 0)
     _align_f = Vector2(0, 0)
@@ -112,6 +193,7 @@ class Boid(object):
 
         count = 0
         self.neighbors = len(actors)
+        self.crowded = False
 
         for other in actors:
             # vector pointing from neighbors to self
@@ -125,6 +207,7 @@ class Boid(object):
 
                 diff.normalize()
                 if d < self.minsep:
+                    self.crowded = True
                     diff /= d  # Weight by distance
                 self._sep_f += diff
 
@@ -133,6 +216,35 @@ class Boid(object):
                 # Align - add the velocity of the neighbouring actors, then average
                 self._align_f += other.velocity
 
+        self._flock(count)
+
+    def clear_sums(self):
+        """
+        Reset the running sums filled in by interact_pairs, the symmetric
+        counterpart of interact.
+        """
+        self.neighbors = 0
+        self.crowded = False
+        self._count = 0
+        self._sep_x = self._sep_y = 0.0
+        self._align_x = self._align_y = 0.0
+        self._cohes_x = self._cohes_y = 0.0
+
+    def apply_sums(self):
+        """
+        Turn the sums gathered by interact_pairs into an acceleration, exactly
+        as interact does with its own neighbour loop.
+        """
+        self._sep_f.x, self._sep_f.y = self._sep_x, self._sep_y
+        self._align_f.x, self._align_f.y = self._align_x, self._align_y
+        self._cohes_sum.x, self._cohes_sum.y = self._cohes_x, self._cohes_y
+        self._flock(self._count)
+
+    def _flock(self, count):
+        """
+        Combine the separation, alignment and cohesion sums over count
+        neighbours into the acceleration.
+        """
         if count > 0:
             # calc the average of the separation vector
             # self._sep_f /=count don't div by count if normalizing anyway!
@@ -1,5 +1,16 @@
 import collections
-from math import floor
+from math import floor, ceil
+
+
+def morton_key(i, j):
+    """interleave the bits of cell coordinates i,j to give its Z-order index"""
+    key = 0
+    bit = 0
+    while (i >> bit) or (j >> bit):
+        key |= ((i >> bit) & 1) << (2*bit)
+        key |= ((j >> bit) & 1) << (2*bit + 1)
+        bit += 1
+    return key
 
 
 class BoidSwarm(object):
@@ -7,14 +18,22 @@ class BoidSwarm(object):
     """
     The grid to hold the boids
     """
+    # with locality on, the storage scatter is checked every reorder_check
+    # rebuilds, and the boids sorted again once it has grown reorder_slack
+    # past its value at the last sort
+    reorder_check = 10
+    reorder_slack = 0.1
 
-    def __init__(self, width, cell_w):
+    def __init__(self, width, cell_w, locality=False):
         """
         Create data structure to hold the things. At the base is a table of cell nodes
         each containing an arbitrary number of units. Need whole number of cells, so cell width
         is the total width (for now in pixel units) divded by the divisions.
         The structure is always square. It can provide boundaries though good level design
         should mean you don't ever hit them.
+        With locality set, rebuild keeps the boids list sorted along a Morton curve
+        of the cells every so often, see reorder. This changes the order boids are
+        updated in, and so the course of a simulation.
         """
 
         self.boids = []  # list of all the boids
@@ -30,6 +49,15 @@ class BoidSwarm(object):
                 # use deque for fast appends of several deque
                 self.cell_table[(i, j)] = collections.deque()
 
+        # position of each cell along a Morton (Z-order) curve, used to keep
+        # boids that are close in space close in the boids list as well
+        self.cell_order = {}
+        for (i, j) in self.cell_table:
+            self.cell_order[(i, j)] = morton_key(i, j)
+        self.locality = locality
+        self._sorted_scatter = None
+        self._since_check = 0
+
     def cell_num(self, x, y):
         """Forces units into border cells if they hit an edge"""
         i = int(floor(x / self.cell_width))
@@ -71,13 +99,87 @@ class BoidSwarm(object):
         I, J = self.cell_num(x, y)
         d = int(d)
         group = collections.deque()
-        for i in range(I-d, I+d):
-            for j in range(J-d, J+d):
+        for i in range(I-d, I+d+1):
+            for j in range(J-d, J+d+1):
                 if (i, j) in self.cell_table:
                     group.extend(self.cell_table[(i, j)])  # merge deque
         return group
 
+    def relocate(self, b, old_x, old_y):
+        """move b from the cell containing old_x,old_y to the one it is in now"""
+        old = self.cell_num(old_x, old_y)
+        new = self.cell_num(b.position.x, b.position.y)
+        if old != new:
+            self.cell_table[old].remove(b)
+            self.cell_table[new].append(b)
+
+    def cell_pairs(self, influence_range):
+        """
+        Yield each pair of cells whose boids can interact exactly once, as
+        (cell, other) tuples: every non-empty cell with itself, then with the
+        forward half of its neighbourhood. The neighbourhood is the same block
+        of cells find_near searches: just the cell itself while influence_range
+        fits within a cell, else every cell within ceil(influence_range/cell_width).
+        """
+        if influence_range <= self.cell_width:
+            ext = 0
+        else:
+            ext = int(ceil(influence_range/self.cell_width))
+        # offsets (di, dj) after (0, 0) in row order, the mirror image of each
+        # is covered when visiting the cell at that offset
+        forward = [(di, dj) for di in range(0, ext+1) for dj in range(-ext, ext+1)
+                   if di > 0 or dj > 0]
+        for (i, j), cell in self.cell_table.items():
+            if not cell:
+                continue
+            yield cell, cell
+            for di, dj in forward:
+                other = self.cell_table.get((i+di, j+dj))
+                if other:
+                    yield cell, other
+
+    def reorder(self):
+        """
+        Sort the boids list along the Morton curve of their cells, so that
+        boids sharing a cell (and hence interacting) sit next to each other.
+        Sorting only moves pointers, so each boid's position and velocity are
+        also copied afresh in the new order, to put the objects read in the
+        interaction loop near each other in memory.
+        Sorts in place since the viewers hold a reference to the list.
+        """
+        cell_order = self.cell_order
+        cell_num = self.cell_num
+        self.boids.sort(key=lambda b: cell_order[cell_num(b.position.x, b.position.y)])
+        for b in self.boids:
+            b.position = b.position.copy()
+            b.velocity = b.velocity.copy()
+        self._sorted_scatter = self.scatter()
+
+    def scatter(self):
+        """
+        The fraction of consecutive boids in the boids list whose cells are not adjacent.
+        """
+        jumps = 0
+        pi, pj = None, None
+        for b in self.boids:
+            i, j = self.cell_num(b.position.x, b.position.y)
+            if pi is not None and (abs(i - pi) > 1 or abs(j - pj) > 1):
+                jumps += 1
+            pi, pj = i, j
+        if len(self.boids) < 2:
+            return 0.0
+        return jumps / float(len(self.boids) - 1)
+
     def rebuild(self):
+        if self.locality:
+            self._since_check -= 1
+            if self._since_check <= 0:
+                # only look every reorder_check ticks, which also bounds how often we sort
+                self._since_check = self.reorder_check
+                if self._sorted_scatter is None or \
+                        self.scatter() > self._sorted_scatter + self.reorder_slack:
+                    self.reorder()
+
         for cell in self.cell_table.values():
             cell.clear()
         for b in self.boids:
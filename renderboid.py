@@ -0,0 +1,199 @@
+#!/usr/bin/env python
+"""
+Headless rendering of a recorded run.
+Steps a simulation without a display, keeps the boid positions of every tick
+and rasterises them in software, rendering ranges of ticks in parallel.
+Frames are written as numbered PPM images, or as one raw RGB stream.
+"""
+from __future__ import division, print_function, absolute_import
+
+import argparse
+import multiprocessing
+import os
+import sys
+from math import cos, sin, floor, ceil
+
+from leader import Leader
+import simulation
+
+
+BACKGROUND = (255, 255, 255)
+BOID_COLOUR = (0, 0, 0)
+LEADER_COLOUR = (255, 0, 0)
+GRID_COLOUR = (128, 128, 128)
+
+
+def record(sim, ticks, dt):
+    """
+    Run sim for a number of ticks of dt seconds, returning the state of the
+    boids before the first tick and after each one, as lists of
+    (x, y, rotation, is_leader) tuples.
+    """
+    frames = [snapshot(sim)]
+    for _ in range(ticks):
+        sim.update(dt)
+        frames.append(snapshot(sim))
+    return frames
+
+
+def snapshot(sim):
+    """the current state of sim's boids, as stored by record"""
+    return [(b.position.x, b.position.y, b.rotation, isinstance(b, Leader))
+            for b in sim.swarm.boids]
+
+
+class Canvas(object):
+    """
+    RGB frame buffer with the same drawing as glboid.World, origin at the bottom left
+    """
+    # same triangle as glboid.World.verts
+    verts = [0.5, 0.0, -0.5, -0.2, -0.5, 0.2]
+
+    def __init__(self, width, height, offx, offy, ent_size=15.0):
+        self.width = width
+        self.height = height
+        self.o_x = offx
+        self.o_y = offy
+        self.ent_size = ent_size
+        self.pixels = bytearray(BACKGROUND * (width * height))
+
+    def clear(self):
+        self.pixels[:] = bytearray(BACKGROUND * (self.width * self.height))
+
+    def set_pixel(self, x, y, colour):
+        if 0 <= x < self.width and 0 <= y < self.height:
+            i = 3 * ((self.height - 1 - y) * self.width + x)
+            self.pixels[i:i+3] = bytearray(colour)
+
+    def draw_entity(self, x, y, rotation, is_leader):
+        """ Draws a boid """
+        size = 2 * self.ent_size if is_leader else self.ent_size
+        c, s = cos(rotation), sin(rotation)
+        pts = []
+        for k in range(0, len(self.verts), 2):
+            vx, vy = self.verts[k] * size, self.verts[k+1] * size
+            pts.append((x + self.o_x + c*vx - s*vy, y + self.o_y + s*vx + c*vy))
+        self.fill_triangle(pts, LEADER_COLOUR if is_leader else BOID_COLOUR)
+
+    def fill_triangle(self, pts, colour):
+        """fill every pixel whose centre lies inside the triangle pts"""
+        (x0, y0), (x1, y1), (x2, y2) = pts
+        area = (x1 - x0) * (y2 - y0) - (x2 - x0) * (y1 - y0)
+        if area == 0:
+            return
+        xmin = max(0, int(floor(min(x0, x1, x2))))
+        xmax = min(self.width - 1, int(ceil(max(x0, x1, x2))))
+        ymin = max(0, int(floor(min(y0, y1, y2))))
+        ymax = min(self.height - 1, int(ceil(max(y0, y1, y2))))
+        for py in range(ymin, ymax + 1):
+            cy = py + 0.5
+            for px in range(xmin, xmax + 1):
+                cx = px + 0.5
+                # edge functions, all the same sign as area when inside
+                w0 = ((x1 - cx) * (y2 - cy) - (x2 - cx) * (y1 - cy)) * area
+                w1 = ((x2 - cx) * (y0 - cy) - (x0 - cx) * (y2 - cy)) * area
+                w2 = ((x0 - cx) * (y1 - cy) - (x1 - cx) * (y0 - cy)) * area
+                if w0 >= 0 and w1 >= 0 and w2 >= 0:
+                    self.set_pixel(px, py, colour)
+
+    def draw_grid(self, cell_width, divisions):
+        w = int(cell_width * divisions)
+        for i in range(divisions):
+            xy = int(i * cell_width)
+            for k in range(min(w, max(self.width, self.height))):
+                self.set_pixel(k, xy, GRID_COLOUR)
+                self.set_pixel(xy, k, GRID_COLOUR)
+
+    def draw(self, frame, grid=None):
+        self.clear()
+        if grid is not None:
+            self.draw_grid(*grid)
+        for ent in frame:
+            self.draw_entity(*ent)
+
+    def ppm(self):
+        return b'P6\n%d %d\n255\n' % (self.width, self.height) + bytes(self.pixels)
+
+
+def render_range(job):
+    """
+    Pool worker: render the frames of one tick range, writing each to its
+    own numbered image or, for a raw stream, returning the pixel data.
+    """
+    start, frames, opts = job
+    canvas = Canvas(opts['width'], opts['height'], opts['offx'], opts['offy'])
+    raw = []
+    for n, frame in enumerate(frames, start):
+        canvas.draw(frame, opts['grid'])
+        if opts['raw']:
+            raw.append(bytes(canvas.pixels))
+        else:
+            path = os.path.join(opts['out'], 'frame_%06d.ppm' % n)
+            with open(path, 'wb') as f:
+                f.write(canvas.ppm())
+    return b''.join(raw)
+
+
+def export(frames, out, width=700, height=700, offx=-25, offy=-25, grid=None,
+           raw=False, processes=None, chunk=50):
+    """
+    Render recorded frames across a process pool, chunk ticks per job.
+    out is a directory for numbered PPM images, or with raw set a file
+    (or '-' for stdout) that receives the frames as one width*height RGB stream.
+    grid is an optional (cell_width, divisions) tuple to draw the swarm's cells.
+    """
+    opts = dict(width=width, height=height, offx=offx, offy=offy, grid=grid,
+                raw=raw, out=out)
+    if not raw and not os.path.isdir(out):
+        os.makedirs(out)
+    jobs = [(start, frames[start:start+chunk], opts)
+            for start in range(0, len(frames), chunk)]
+
+    pool = multiprocessing.Pool(processes)
+    try:
+        if raw:
+            stream = sys.stdout if out == '-' else open(out, 'wb')
+            stream = getattr(stream, 'buffer', stream)
+            try:
+                # imap keeps the chunks in tick order
+                for data in pool.imap(render_range, jobs):
+                    stream.write(data)
+            finally:
+                if out != '-':
+                    stream.close()
+        else:
+            pool.map(render_range, jobs)
+    finally:
+        pool.close()
+        pool.join()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('out', help="output directory, or file for --raw ('-' for stdout)")
+    parser.add_argument('--boids', type=int, default=150)
+    parser.add_argument('--leaders', type=int, default=5)
+    parser.add_argument('--field', type=int, default=750)
+    parser.add_argument('--ticks', type=int, default=600)
+    parser.add_argument('--dt', type=float, default=1/60)
+    parser.add_argument('--size', type=int, default=700, help="frame width and height in pixels")
+    parser.add_argument('--grid', action='store_true', help="draw the swarm's cells")
+    parser.add_argument('--raw', action='store_true', help="write a raw RGB stream instead of images")
+    parser.add_argument('--processes', type=int, default=None)
+    args = parser.parse_args()
+
+    sim = simulation.Simulation(args.boids, args.field, leaders=args.leaders,
+                                verbose=False)
+    frames = record(sim, args.ticks, args.dt)
+    grid = (sim.swarm.cell_width, sim.swarm.divisions) if args.grid else None
+    export(frames, args.out, args.size, args.size, grid=grid, raw=args.raw,
+           processes=args.processes)
+
+
+if __name__ == '__main__':
+    import random
+
+    # Deterministic randomness.
+    random.seed(42)
+
+    main()
@@ -21,7 +21,7 @@ from __future__ import division, print_function, absolute_import, unicode_litera
 
 import random
 
-from boid import Boid
+from boid import Boid, interact_pairs
 from boid_swarm import BoidSwarm
 from leader import Leader
 
@@ -34,12 +34,24 @@ class Simulation(object):
     other. This class keeps the two separated
     """
 
-    def __init__(self, starting_units=100, field_size=800, leaders=0):
+    def __init__(self, starting_units=100, field_size=800, leaders=0, pairwise=False,
+                 adaptive=False, locality=False, verbose=True):
         """
+        With pairwise set, all interactions are worked out up front by a single
+        symmetric pass over the swarm's cell pairs before any boid moves,
+        instead of each boid scanning its neighbours in turn.
+        With adaptive set, fast or crowded boids split dt into smaller steps,
+        interacting again before each one, so that large dt values stay stable.
+        locality has the swarm keep its boids sorted along a space-filling curve.
+        verbose prints the average speed every tick.
         """
-        self.swarm = BoidSwarm(field_size+2*40, Boid.influence_range+5)  # /2
+        self.swarm = BoidSwarm(field_size+2*40, Boid.influence_range+5,  # /2
+                               locality=locality)
         self.field_size = field_size
         self.pad = 40  # use to keep boids inside the play field
+        self.pairwise = pairwise
+        self.adaptive = adaptive
+        self.verbose = verbose
 
         for _ in range(starting_units):
             b = Boid(random.uniform(100, 400),
@@ -57,22 +69,63 @@ class Simulation(object):
     def update(self, dt):
         """dt is in seconds"""
 
-        avg_speed = 0.0
-
-        for b in self.swarm.boids:
-            close_boids = self.swarm.find_near(b.position.x, b.position.y, b.influence_range)
-            b.interact(close_boids)
-            b.update(dt)
-            w = self.field_size
-            p = self.pad
-            b.borders(p, w-p, p, w-p)  # keep the boids inside the borders
-
-            avg_speed += b.speed
-
-        avg_speed = avg_speed / len(self.swarm.boids)
-
-        leader = Leader(42, 42)
-        print("%s -- %s" % (avg_speed, leader.speed))
+        if self.pairwise:
+            for b in self.swarm.boids:
+                b.clear_sums()
+            interact_pairs(self.swarm.cell_pairs(Boid.influence_range))
+            for b in self.swarm.boids:
+                b.apply_sums()
+
+        if self.adaptive:
+            self._update_substepped(dt)
+        else:
+            for b in self.swarm.boids:
+                if not self.pairwise:
+                    close_boids = self.swarm.find_near(b.position.x, b.position.y, b.influence_range)
+                    b.interact(close_boids)
+                b.update(dt)
+                self._keep_inside(b)
+
+        avg_speed = sum(b.speed for b in self.swarm.boids) / len(self.swarm.boids)
+
+        if self.verbose:
+            leader = Leader(42, 42)
+            print("%s -- %s" % (avg_speed, leader.speed))
 
         # rebuild the swarm once we've updated all the positions
         self.swarm.rebuild()
+
+    def _keep_inside(self, b):
+        w = self.field_size
+        p = self.pad
+        b.borders(p, w-p, p, w-p)  # keep the boids inside the borders
+
+    def _update_substepped(self, dt):
+        """
+        Move the boids over dt, in the number of steps each needs (see
+        Boid.substeps). Before each of its later steps a boid interacts again
+        with its neighbours' current positions, and after every step it is
+        moved into its new cell, so neighbour lookups stay correct.
+        """
+        swarm = self.swarm
+        steps = []
+        for b in swarm.boids:
+            if not self.pairwise:
+                b.interact(swarm.find_near(b.position.x, b.position.y, b.influence_range))
+            n = b.substeps(dt, swarm.cell_width)
+            steps.append(n)
+            self._step(b, dt / n)
+
+        levels = max(steps) if steps else 1
+        for k in range(1, levels):
+            for b, n in zip(swarm.boids, steps):
+                # a boid with n steps moves on every (levels/n)th level
+                if k % (levels // n) == 0:
+                    b.interact(swarm.find_near(b.position.x, b.position.y, b.influence_range))
+                    self._step(b, dt / n)
+
+    def _step(self, b, t):
+        x, y = b.position.x, b.position.y
+        b.update(t)
+        self._keep_inside(b)
+        self.swarm.relocate(b, x, y)